@@ -39,10 +39,230 @@ Usage:
     reader=CinradReaderSTD(filename)
 """
 
+import array
+import os
 import numpy as np
 import struct
 from pathlib import Path
 
+from .RadarCalculationHelper import haversine_distance, calculate_bearing
+from .RadarCalculationHelper import haversine_distance_vec, calculate_bearing_vec
+
+
+# 各数据块的二进制结构(小端)及字段名，字段顺序与标准格式手册一致
+# 通用头 32字节
+_GENERIC_HEADER = struct.Struct("<4sHHii16s")
+_GENERIC_HEADER_KEYS = (
+    'magicNumber', #固定标识(RSTM)
+    'majorVersion', #主版本号
+    'minorVersion', #次版本号
+    'genericType', #文件类型
+    'productType', #产品类型
+    'reserved', #保留字段
+)
+# 站点配置信息 128字节
+_SITE_CONF = struct.Struct("<8s32sffiifffihhhhh46s")
+_SITE_CONF_KEYS = (
+    'siteCode', #站号
+    'siteName', #站点名称
+    'latitude', #纬度
+    'longitude', #经度
+    'antennaHeight', #天线高度
+    'groundHeight', #地面高度
+    'frequency', #工作频率
+    'beamWidthHori', #水平波束宽度
+    'beamWidthVert', #垂直波束宽度
+    'rdaVersion', #RDA版本号
+    'radarType', #雷达类型
+    'antennaGain', #天线增益
+    'transmittingFeederLoss', #发射馈线损耗
+    'receivingFeederLoss', #接收馈线损耗
+    'otherLoss', #其他损耗
+    'reserved', #保留字段
+)
+# 任务配置信息 256字节
+_TASK_CONF = struct.Struct("<32s128siiiiifffffffff40s")
+_TASK_CONF_KEYS = (
+    'taskName', #任务名称
+    'taskDescription', #任务描述
+    'polarizationType', #极化方式
+    'scanType', #扫描任务类型
+    'pulseWidth', #脉冲宽度
+    'scanStartTime', #扫描开始时间
+    'cutNumber', #扫描层数
+    'horizontalNoise', #水平通道噪声
+    'verticalNoise', #垂直通道噪声
+    'horizontalCalibration', #水平通道标定值
+    'verticalCalibration', #垂直通道标定值
+    'horizontalNoiseTemperature', #水平通道噪声温度
+    'verticalNoiseTemperature', #垂直通道噪声温度
+    'zdrCalibration', #ZDR标定偏差
+    'phidpCalibration', #差分相移标定偏差
+    'ldrCalibration', #系统LDR标定偏差
+    'reserved', #保留字段
+)
+# 扫描层配置信息 256字节，重复的字段名以后出现的值为准
+_CUT_CONF = struct.Struct("<iiffiffffffiiiiiiiiffqqifffffff4siiiii12s4sihhhh72s")
+_CUT_CONF_KEYS = (
+    'processMode', #处理模式
+    'waveForm', #波形类别
+    'prf1', #脉冲重复频率1
+    'prf2', #脉冲重复频率2
+    'dealiasingMode', #速度退模糊方法
+    'azimuth', #方位角
+    'elevation', #俯仰角
+    'startAngle', #起始角度
+    'endAngle', #结束角度
+    'angularResolution', #角度分辨率
+    'scanSpeed', #扫描速度
+    'logResolution', #强度分辨率
+    'dopplerResolution', #多普勒分辨率
+    'maximumRange', ##1 最大距离1
+    'maximumRange', ##2 最大距离2
+    'startRange', #起始距离
+    'sample', ##1 采样个数1
+    'sample', ##2 采样个数2
+    'phaseMode', #相位编码模式
+    'atmosphericLoss', #大气衰减
+    'nyquistSpeed', #最大不模糊速度
+    'momentsMask', #数据类型掩码
+    'momentsSizeMask', #数据大小掩码
+    'miscFilterMask', #滤波设置掩码
+    'sqiThreshold', #SQI门限
+    'sigThreshold', #SIG门限
+    'csrThreshold', #CSR门限
+    'logThreshold', #LOG门限
+    'cpaThreshold', #CPA门限
+    'pmiThreshold', #PMI门限
+    'dplogThreshold', #PMI门限
+    'thresholdsr', #阈值门限保留
+    'dBTMask', #dBT质控掩码
+    'dBZMask', #dBZ质控掩码
+    'velocityMask', #速度质控掩码
+    'spectrumWidthMask', #谱宽质控掩码
+    'dpMask', #偏振量质控掩码
+    'maskReserved', #质控掩码保留位
+    'reserved1', #扫描同步标志
+    'direction', #天线运行方向
+    'groundClutterClassifierType', #地物杂波图类型
+    'groundClutterFilterType', #地物滤波类型
+    'groundClutterFilterNotchWidth', #地物滤波宽度
+    'groundClutterFilterWindow', #滤波窗口类型
+    'reserved2', #保留字段
+)
+# 径向头 64字节，径向数量多，以numpy结构化类型一次解析全部径向头
+_RADIAL_HEADER_KEYS = (
+    'radialState', #径向数据状态
+    'spotBlank', #消隐标志
+    'sequenceNumber', #序号
+    'radialNumber', #径向数
+    'elevationNumber', #仰角编号
+    'azimuth', #方位角
+    'elevation', #仰角
+    'seconds', #秒
+    'microseconds', #微秒
+    'lengthofdata', #数据长度
+    'momentNumber', #数据类别数量
+    'reserved1', #保留字段
+    'horizontalEstimatedNoise', #径向的水平估计噪声
+    'verticalEstimatedNoise', #径向的垂直估计噪声
+    'zipType', #压缩类型
+    'reserved2', #保留字段
+)
+_RADIAL_HEADER = np.dtype(list(zip(_RADIAL_HEADER_KEYS,
+    ('<i4','<i4','<i4','<i4','<i4','<f4','<f4','<i4','<i4','<i4','<i4','<i2','<i2','<i2','S1','S13'))))
+# 径向数据头 32字节
+_MOMENT_HEADER_KEYS = (
+    'dataType', #数据类型
+    'scale', #比例
+    'offset', #偏移
+    'binLength', #库字节长度
+    'flags', #标志
+    'length', #长度
+    'reserved', #保留字段
+)
+_MOMENT_HEADER = np.dtype(list(zip(_MOMENT_HEADER_KEYS,
+    ('<i4','<i4','<i4','<i2','<i2','<i4','S12'))))
+_INT32 = struct.Struct("<i")
+
+# 径向数据按数据类型分别存储的各项属性及其类型码
+_RADIAL_FIELDS = (
+    ('dataLength', 'i'),
+    ('radialState', 'i'),
+    ('spotBlank', 'i'),
+    ('sequenceNumber', 'i'),
+    ('radialNumber', 'i'),
+    ('elevationNumber', 'i'),
+    ('azimuth', 'f'),
+    ('elevation', 'f'),
+    ('seconds', 'i'),
+    ('microseconds', 'i'),
+    ('horizontalEstimatedNoise', 'h'),
+    ('verticalEstimatedNoise', 'h'),
+)
+# 径向数据头中的比例与偏移，同样逐径向存储，取数时才把原始计数解码为物理量
+_MOMENT_FIELDS = (
+    ('scale', 'i'),
+    ('offset', 'i'),
+)
+# 库字节长度对应的原始数据类型
+_BIN_DTYPES = {1: np.dtype(np.uint8), 2: np.dtype('<u2')}
+# 批量查找方位角时每次处理的点数，限制(点数,径向数)临时数组的内存占用
+_AZIMUTH_CHUNK = 4096
+
+
+def _scan_radials_py(buf, off):
+    """
+    从off开始顺序扫描径向数据块，直到radialState为4的径向结束
+
+    Return:
+    (radial_offsets,moment_offsets,moment_radial,complete)
+    各径向头与径向数据头的位置，moment_radial为径向数据头所属径向的序号，complete为False时数据不完整
+    """
+    unpack_int=_INT32.unpack_from
+    state_pos=_RADIAL_HEADER.fields['radialState'][1]
+    number_pos=_RADIAL_HEADER.fields['momentNumber'][1]
+    length_pos=_MOMENT_HEADER.fields['length'][1]
+    size=len(buf)
+    empty=np.empty(0,dtype=np.int64)
+    radial_offsets,moment_offsets,moment_radial=array.array('q'),array.array('q'),array.array('q')
+    while True:
+        if off+_RADIAL_HEADER.itemsize>size:
+            return (empty,empty,empty,False)
+        nr=len(radial_offsets)
+        radial_offsets.append(off)
+        state=unpack_int(buf,off+state_pos)[0]
+        moment_number=unpack_int(buf,off+number_pos)[0]
+        off+=_RADIAL_HEADER.itemsize
+        for ri in range(moment_number):
+            if off+_MOMENT_HEADER.itemsize>size:
+                return (empty,empty,empty,False)
+            moment_offsets.append(off)
+            moment_radial.append(nr)
+            length=unpack_int(buf,off+length_pos)[0]
+            if length<0:
+                return (empty,empty,empty,False)
+            off+=_MOMENT_HEADER.itemsize+length
+            if off>size:
+                return (empty,empty,empty,False)
+        if state==4:
+            break
+    return (np.array(radial_offsets,dtype=np.int64),np.array(moment_offsets,dtype=np.int64),
+            np.array(moment_radial,dtype=np.int64),True)
+
+
+def _copy_bins_py(buf, src, nbytes, out):
+    """把buf中从src[i]开始的nbytes[i]个字节拷贝到out第i行的开头"""
+    for i,(start,n) in enumerate(zip(src.tolist(),nbytes.tolist())):
+        out[i,:n]=np.frombuffer(buf,dtype=np.uint8,count=n,offset=start)
+
+
+try:
+    # 已编译C扩展时用其扫描径向与拷贝数据，否则使用上面的纯Python实现
+    from ._cinrad_parse import scan_radials as _scan_radials, copy_bins as _copy_bins
+except ImportError:
+    _scan_radials, _copy_bins = _scan_radials_py, _copy_bins_py
+
 
 class RadarError(Exception):
     def __init__(self, description):
@@ -66,7 +286,8 @@ class CinradReaderSTD():
             'radial_block':[],
             "radial": {}
         }
-        self.vcp_standard_elevation={
+        self._cut_ranges={} #各数据类型每个cut在径向存储中的(起始,结束)位置
+        self.vcp_standard_elevation={k:np.asarray(v,dtype=np.float64) for k,v in {
             'VCP11':[0.50,1.45,2.40,3.35,4.30,5.25,6.2,7.5,8.7,10.00,12.00,14.00,16.70,19.50],
             'VCP11D':[0.48,0.48,1.49,1.49,2.42,3.34,4.31,5.23,6.20,7.51,8.70,10.02,12.00,14.02,16.70,19.51],
             'VCP21':[0.50,1.45,2.40,3.35,4.30,6.00,9.90,14.6,19.5],
@@ -75,7 +296,7 @@ class CinradReaderSTD():
             'VCP31D':[0.48,0.48,1.49,1.49,2.50,2.50,3.52,4.48],
             'VCP32':[0.50,1.5,2.50,3.5,4.50],
             'VCP32D':[0.48,0.48,1.49,1.49,2.50,3.52,4.48]
-        }
+        }.items()}
         self.filepath = filepath
         if filepath!=None:
             self.read_data(filepath)
@@ -98,21 +319,45 @@ class CinradReaderSTD():
         datatype (str): 数据类型，例如dBZ、ZDR、V、W等
         item (str): 数据项目，可选的例如elevation、ppiElevation等
         '''
-        return list(set(self.data['radial'][datatype][item]))
+        return np.unique(self.data['radial'][datatype][item]).tolist()
     
     def get_values_bylatlon(self, lat, lon, datatype="dBZ"):
         """
         通过经纬度获取所有层的回波数据值
         """
-        result={'height':[],'value':[]}
-        for layerid,v in enumerate(self.data['common_block']['cut_conf']):
+        return self.get_values_bylatlon_batch([lat], [lon], datatype)[0]
+
+    def get_values_bylatlon_batch(self, lats, lons, datatype="dBZ"):
+        """
+        通过多组经纬度批量获取所有层的回波数据值
+
+        距离与方位角对所有查询点一次性计算，每层对所有点一次性查找，结果与逐点调用get_values_bylatlon一致。
+        lats、lons可以是任意形状(例如meshgrid生成的二维网格)，按展平(ravel)后的顺序逐点查询
+
+        Return:
+        list, 按展平后的顺序，每个元素为对应查询点的{'height':[],'value':[]}
+        """
+        site_lat=self.data['common_block']['site_conf']['latitude']
+        site_lon=self.data['common_block']['site_conf']['longitude']
+
+        lats=np.asarray(lats,dtype=np.float64).ravel()
+        lons=np.asarray(lons,dtype=np.float64).ravel()
+        if lats.size!=lons.size:
+            raise ValueError("lats与lons的点数不一致(%d,%d)"%(lats.size,lons.size))
+        distances=haversine_distance_vec(lats,lons,site_lat,site_lon)*1000
+        azimuths=calculate_bearing_vec(site_lat,site_lon,lats,lons)
+
+        results=[{'height':[],'value':[]} for _ in range(distances.size)]
+        # 层号与elevationNumber一致从1开始
+        for layerid in range(1,len(self.data['common_block']['cut_conf'])+1):
             if not self.has_element(layerid,datatype):
                 continue
-            height,value = self.get_value_bylatlon(lat,lon,layerid,datatype)
-            result['height'].append(height)
-            result['value'].append(value)
-        return result
-    
+            heights,values,valid = self._get_values_bypolar(distances, azimuths, layerid, datatype)
+            for i in np.flatnonzero(valid).tolist():
+                results[i]['height'].append(heights[i])
+                results[i]['value'].append(values[i])
+        return results
+
     def get_value_bylatlon(self, lat, lon, layerid, datatype="dBZ"):
         """
         通过经纬度获取特定层的回波数据值
@@ -121,9 +366,6 @@ class CinradReaderSTD():
         site_lon=self.data['common_block']['site_conf']['longitude']
         site_alt=self.data['common_block']['site_conf']['antennaHeight']
 
-        from .RadarCalculationHelper import haversine_distance
-        from .RadarCalculationHelper import calculate_bearing
-
         distance=haversine_distance(lat,lon,site_lat,site_lon)*1000
         azimuth=calculate_bearing(site_lat,site_lon,lat,lon)
         # print(lat,lon,site_lat,site_lon)
@@ -144,38 +386,64 @@ class CinradReaderSTD():
         Return:
         height,value
         """
+        heights,values,valid = self._get_values_bypolar(
+            np.array([distance],dtype=np.float64), np.array([azimuth],dtype=np.float64), layerid, datatype)
+        if not valid[0]:
+            # print("radius：%s超出了雷达的最大可探测范围%s！" % (radius, max_radius))
+            return None
+        return (heights[0],values[0])
+
+    def _get_values_bypolar(self, distance, azimuth, layerid, datatype="dBZ"):
+        """
+        get_value_bypolar的数组版本，对一组(distance,azimuth)在同一层上一次性查找
+
+        Return:
+        (height,value,valid)，valid为False的点超出了雷达的最大可探测范围，其value为nan
+        """
         # 获取数据
         start_pos,end_pos=self.get_cut_data_index(layerid,datatype)
         radar_data=self.data['radial'][datatype]['data'][start_pos:end_pos]
-        azimuth_list=self.data['radial'][datatype]['azimuth'][start_pos:end_pos]
+        azimuth_arr=self.data['radial'][datatype]['azimuth'][start_pos:end_pos]
+        scale_arr=self.data['radial'][datatype]['scale'][start_pos:end_pos]
+        offset_arr=self.data['radial'][datatype]['offset'][start_pos:end_pos]
+        length_arr=self.data['radial'][datatype]['dataLength'][start_pos:end_pos]
 
         layer_elevation=self.get_standard_elevation_byid(layerid,self.data['common_block']['task_conf']['taskName'])
         radius = distance / np.cos(np.deg2rad(layer_elevation))
         
-        ku_count = len(radar_data[0])
+        ku_count = int(length_arr[0])
         ku_length = self.get_ku_length(layerid,datatype)
         max_radius = ku_length * ku_count
-        if radius > max_radius:
-            # print("radius：%s超出了雷达的最大可探测范围%s！" % (radius, max_radius))
-            return None
         
-        diff_azimuth_arr = abs(np.array(azimuth_list) - azimuth)
-        azimuth_index = np.where(diff_azimuth_arr == np.min(diff_azimuth_arr))[0][0]
+        # 每个点在该层所有径向中找方位角最接近的一条
+        azimuth_index = np.empty(azimuth.shape, dtype=np.intp)
+        for i in range(0, azimuth.size, _AZIMUTH_CHUNK):
+            chunk = azimuth[i:i+_AZIMUTH_CHUNK]
+            azimuth_index[i:i+_AZIMUTH_CHUNK] = np.argmin(np.abs(azimuth_arr[None, :] - chunk[:, None]), axis=1)
+        bin_index = (radius / ku_length).astype(np.intp)
+        # 径向按最长径向补0存储，超出所在径向实际库数的点同样无效
+        valid = (radius < max_radius) & (bin_index < length_arr[azimuth_index])
         # print("查找到的方位角索引值为%s,对应的θ值为%s,ρ值为%s,库长为%s,数据索引值为%s."%
         #     (find_theta_index, find_theta,rho,ku_length,int(rho / ku_length)))
         # print("你查询点的数据值为：%s"%target_data[find_theta_index][int(rho / ku_length)])
+        value = np.full(distance.shape, np.nan, dtype=np.float32)
+        rows = azimuth_index[valid]
+        raw = radar_data[rows, bin_index[valid]]
+        value[valid] = self._dequantize(raw, scale_arr[rows], offset_arr[rows])
 
         # 计算离地高度, 要考虑到地球曲率
         height = np.sin(np.deg2rad(layer_elevation))*distance
         r = 6371393 # 地球半径
         rm = 8500000 # 等效地球半径
-        a=np.sqrt(2*(r**2)-2*(r**2)*np.cos(distance/r))
-        b=np.sqrt(rm**2+a**2-2*rm*a*np.cos((np.pi-distance/r)/2))
-        h=rm-b
+        # 弦长a=sqrt(2r²-2r²cos(d/r))=2r·sin(d/2r)，且cos((π-d/r)/2)=sin(d/2r)，
+        # 故b²=rm²+a²-2·rm·a·cos((π-d/r)/2)=rm²-4r(rm-r)sin²(d/2r)，h=rm-b=(rm²-b²)/(rm+b)
+        s2=np.sin(distance/(2*r))**2
+        b=np.sqrt(rm**2-4*r*(rm-r)*s2)
+        h=4*r*(rm-r)*s2/(rm+b)
         # h=r/np.cos(distance/r)-r
         # h=h*np.cos(distance/r)
         # print('height is %f,h is %f'%(height,h))
-        return (height+h,radar_data[azimuth_index][int(radius / ku_length)])
+        return (height+h,value,valid)
         
     
     def get_ppi_data(self,layerid,show_range=330000,datatype='dBZ'):
@@ -194,28 +462,29 @@ class CinradReaderSTD():
         # 获取连续的数据
         radar_data=self.data['radial'][datatype]['data'][start_pos:end_pos]
         dataLength=self.data['radial'][datatype]['dataLength'][start_pos:end_pos]
-        lentypelist=list(set(dataLength))
-        if len(lentypelist)!=1:
+        if not np.all(dataLength==dataLength[0]):
             self.last_error='检测到一个ppi屏幕的不同径向数据库数不同。'
             return None
-        radar_data=np.array(radar_data).astype(np.float64)
         azimuth=self.data['radial'][datatype]['azimuth'][start_pos:end_pos]
         elevation=self.data['radial'][datatype]['elevation'][start_pos:end_pos]
         # 裁剪雷达数据
         max_range = 0
         ku_length = 0
-        ku_count = lentypelist[0]
+        ku_count = int(dataLength[0])
         ku_length = self.get_ku_length(layerid,datatype)
         max_range = ku_length * ku_count
         if show_range > max_range:
             print("传入的show_range：%s超出了雷达的最大可探测范围%s，系统将自动进行重置！" % (show_range, max_range))
             show_range = max_range
-        show_data=radar_data.transpose()[:int(show_range / ku_length)].transpose()
+        # 按库截取后只对显示窗口内的数据解码
+        show_data=self._dequantize(radar_data[:, :int(show_range / ku_length)],
+                                   self.data['radial'][datatype]['scale'][start_pos:end_pos,None],
+                                   self.data['radial'][datatype]['offset'][start_pos:end_pos,None])
         # print(show_data.shape)
-        show_data= np.ma.array (show_data, mask=np.isnan(show_data))#nan数据标记为bad
+        show_data= np.ma.masked_invalid(show_data, copy=False)#nan数据标记为bad
         # 获得极轴坐标轴
         # rho = np.arange(ku_length, int(show_range) + ku_length, ku_length) #该方法在显示范围不是库长整数倍时rho坐标轴比数据多一个
-        radius = list(range(ku_length, ku_length+ku_length*show_data.shape[1], ku_length))
+        radius = np.arange(ku_length, ku_length*(show_data.shape[1]+1), ku_length)
         return (radius,azimuth,elevation,show_data)
     
     def get_cut_data_index(self,cutid,datatype='dBZ'):
@@ -225,28 +494,26 @@ class CinradReaderSTD():
         # 获取连续的数据
         if not self.has_element(cutid,datatype):
             raise RadarError("当前要素在当前层不存在!")
-        # 找到数据的起始和结束位置
-        start_pos,end_pos = None,None
-        continuous_state=False
-        for i, value in enumerate(self.data['radial'][datatype]['elevationNumber']):
-            if continuous_state==False:
-                if value == cutid:
-                    start_pos = i
-                    continuous_state=True
-            else:
-                if value !=cutid:
-                    end_pos = i
-                    break
-        return (start_pos,end_pos)
+        return self._cut_ranges[datatype][cutid]
     
     def has_element(self,cutid,datatype='dBZ'):
         """
         返回cut中是否存在某个要素
         """
-        if cutid in self.data['radial'][datatype]['elevationNumber']:
-            return True
-        else:
-            return False
+        return cutid in self._cut_ranges[datatype]
+
+    def _build_cut_ranges(self):
+        """根据elevationNumber一次性建立各cut连续数据的起止位置索引"""
+        self._cut_ranges={}
+        for datatype,store in self.data['radial'].items():
+            en=np.asarray(store['elevationNumber'])
+            change=np.flatnonzero(np.diff(en)!=0)+1
+            boundaries=np.concatenate(([0],change,[len(en)])).tolist()
+            ranges={}
+            for start,end in zip(boundaries[:-1],boundaries[1:]):
+                # 同一cut出现多段时与原先的顺序查找一致，取第一段
+                ranges.setdefault(int(en[start]),(start,end))
+            self._cut_ranges[datatype]=ranges
     
     def get_ku_length(self,layerid,datatype='dBZ'):
         """
@@ -291,222 +558,154 @@ class CinradReaderSTD():
     def rhexgbk(self,bytes_data,encoding=None):
         """从二进制block_data读取slen长度的字符并用encoding解码，以x00作为字符串结束"""
         #str(struct.unpack("16s",block_data[0:16])[0],'gb2312').rstrip("\x00")有可能0x00后乱码字符
-        if encoding==None:
-            return bytes_data[:bytes_data.find(0x00)]
         zs=bytes_data.find(0x00)
-        if zs==-1:
-            return str(bytes_data,encoding)
-        return str(bytes_data[:bytes_data.find(0x00)],encoding)
+        if zs>=0:
+            bytes_data=bytes_data[:zs]
+        if encoding==None:
+            return bytes_data
+        return bytes_data.decode(encoding,errors='replace')
 
     def read_data(self, filepath=None):
-        '''读取并解析文件'''
+        '''
+        读取并解析文件
+
+        文件不完整(在径向头、径向数据头或库数据中被截断)时抛出RadarError，不读入残缺的径向
+        '''
         path = Path(filepath)
         filename = path.name
         filetype = path.suffix
         # 开始读取文件数据
         f = None
         if filetype.endswith('bz2'):
-            import bz2
-            f = bz2.open(filepath, 'rb')
+            try:
+                # indexed_bzip2为可选依赖，可多线程并行解压各bz2数据块
+                from indexed_bzip2 import IndexedBzip2File
+                f = IndexedBzip2File(filepath, parallelization=os.cpu_count())
+            except ImportError:
+                import bz2
+                f = bz2.open(filepath, 'rb')
         else:
             f = open(filepath, 'rb')
+        # 一次读入(解压)全部内容，之后按偏移量off在内存中解析
+        with f:
+            buf=memoryview(f.read())
+        off=0
         # 通用头
-        block_data=f.read(32)
-        pdata={}
-        pdata["magicNumber"]=self.rhexgbk(struct.unpack("4s",block_data[0:4])[0],'gb2312') #固定标识(RSTM)
+        pdata=dict(zip(_GENERIC_HEADER_KEYS,_GENERIC_HEADER.unpack_from(buf,off)))
+        off+=_GENERIC_HEADER.size
+        pdata["magicNumber"]=self.rhexgbk(pdata["magicNumber"],'gb2312')
         if pdata["magicNumber"]!='RSTM':
             raise RadarError("雷达文件类型并非STD，固定标识检查不一致，请核实!")
-        pdata["majorVersion"]=struct.unpack("H",block_data[4:6])[0] #主版本号
-        pdata["minorVersion"]=struct.unpack("H",block_data[6:8])[0] #次版本号
-        pdata["genericType"]=struct.unpack("i",block_data[8:12])[0] #文件类型
-        pdata["productType"]=struct.unpack("i",block_data[12:16])[0] #产品类型
-        pdata["reserved"]=self.rhexgbk(struct.unpack("16s",block_data[16:32])[0]) #保留字段
+        pdata["reserved"]=self.rhexgbk(pdata["reserved"])
         self.data['common_block']['generic_header']=pdata
         # 站点配置信息
-        block_data=f.read(128)
-        pdata={}
-        pdata['siteCode']=self.rhexgbk(struct.unpack("8s",block_data[0:8])[0],'gb2312') #站号
-        pdata['siteName']=self.rhexgbk(struct.unpack("32s",block_data[8:40])[0],'gb2312') #站点名称
-        pdata['latitude']=struct.unpack("f",block_data[40:44])[0] #纬度
-        pdata['longitude']=struct.unpack("f",block_data[44:48])[0] #经度
-        pdata['antennaHeight']=struct.unpack("i",block_data[48:52])[0] #天线高度
-        pdata['groundHeight']=struct.unpack("i",block_data[52:56])[0] #地面高度
-        pdata['frequency']=struct.unpack("f",block_data[56:60])[0] #工作频率
-        pdata['beamWidthHori']=struct.unpack("f",block_data[60:64])[0] #水平波束宽度
-        pdata['beamWidthVert']=struct.unpack("f",block_data[64:68])[0] #垂直波束宽度
-        pdata['rdaVersion']=struct.unpack("i",block_data[68:72])[0] #RDA版本号
-        pdata['radarType']=struct.unpack("h",block_data[72:74])[0] #雷达类型
-        pdata['antennaGain']=struct.unpack("h",block_data[74:76])[0] #天线增益
-        pdata['transmittingFeederLoss']=struct.unpack("h",block_data[76:78])[0] #发射馈线损耗
-        pdata['receivingFeederLoss']=struct.unpack("h",block_data[78:80])[0] #接收馈线损耗
-        pdata['otherLoss']=struct.unpack("h",block_data[80:82])[0] #其他损耗
-        pdata['reserved']=self.rhexgbk(struct.unpack("46s",block_data[82:128])[0]) #保留字段
+        pdata=dict(zip(_SITE_CONF_KEYS,_SITE_CONF.unpack_from(buf,off)))
+        off+=_SITE_CONF.size
+        pdata['siteCode']=self.rhexgbk(pdata['siteCode'],'gb2312')
+        pdata['siteName']=self.rhexgbk(pdata['siteName'],'gb2312')
+        pdata['reserved']=self.rhexgbk(pdata['reserved'])
         self.data['common_block']['site_conf']=pdata
         # 任务配置信息
-        block_data=f.read(256)
-        pdata={}
-        pdata['taskName']=self.rhexgbk(struct.unpack("32s",block_data[0:32])[0],'gb2312') #任务名称
-        pdata['taskDescription']=self.rhexgbk(struct.unpack("128s",block_data[32:160])[0],'gb2312') #任务描述
-        pdata['polarizationType']=struct.unpack("i",block_data[160:164])[0] #极化方式
-        pdata['scanType']=struct.unpack("i",block_data[164:168])[0] #扫描任务类型
-        pdata['pulseWidth']=struct.unpack("i",block_data[168:172])[0] #脉冲宽度
-        pdata['scanStartTime']=struct.unpack("i",block_data[172:176])[0] #扫描开始时间
-        pdata['cutNumber']=struct.unpack("i",block_data[176:180])[0] #扫描层数
-        pdata['horizontalNoise']=struct.unpack("f",block_data[180:184])[0] #水平通道噪声
-        pdata['verticalNoise']=struct.unpack("f",block_data[184:188])[0] #垂直通道噪声
-        pdata['horizontalCalibration']=struct.unpack("f",block_data[188:192])[0] #水平通道标定值
-        pdata['verticalCalibration']=struct.unpack("f",block_data[192:196])[0] #垂直通道标定值
-        pdata['horizontalNoiseTemperature']=struct.unpack("f",block_data[196:200])[0] #水平通道噪声温度
-        pdata['verticalNoiseTemperature']=struct.unpack("f",block_data[200:204])[0] #垂直通道噪声温度
-        pdata['zdrCalibration']=struct.unpack("f",block_data[204:208])[0] #ZDR标定偏差
-        pdata['phidpCalibration']=struct.unpack("f",block_data[208:212])[0] #差分相移标定偏差
-        pdata['ldrCalibration']=struct.unpack("f",block_data[212:216])[0] #系统LDR标定偏差
-        pdata['reserved']=self.rhexgbk(struct.unpack("40s",block_data[216:256])[0]) #保留字段
+        pdata=dict(zip(_TASK_CONF_KEYS,_TASK_CONF.unpack_from(buf,off)))
+        off+=_TASK_CONF.size
+        pdata['taskName']=self.rhexgbk(pdata['taskName'],'gb2312')
+        pdata['taskDescription']=self.rhexgbk(pdata['taskDescription'],'gb2312')
+        pdata['reserved']=self.rhexgbk(pdata['reserved'])
         self.data['common_block']['task_conf']=pdata
-        # 扫描层配置信息
-        for i in range(self.data['common_block']['task_conf']['cutNumber']):
-            block_data=f.read(256)
-            pdata={}
-            pdata['processMode']=struct.unpack("i",block_data[0:4])[0] #处理模式
-            pdata['waveForm']=struct.unpack("i",block_data[4:8])[0] #波形类别
-            pdata['prf1']=struct.unpack("f",block_data[8:12])[0] #脉冲重复频率1
-            pdata['prf2']=struct.unpack("f",block_data[12:16])[0] #脉冲重复频率2
-            pdata['dealiasingMode']=struct.unpack("i",block_data[16:20])[0] #速度退模糊方法
-            pdata['azimuth']=struct.unpack("f",block_data[20:24])[0] #方位角
-            pdata['elevation']=struct.unpack("f",block_data[24:28])[0] #俯仰角
-            pdata['startAngle']=struct.unpack("f",block_data[28:32])[0] #起始角度
-            pdata['endAngle']=struct.unpack("f",block_data[32:36])[0] #结束角度
-            pdata['angularResolution']=struct.unpack("f",block_data[36:40])[0] #角度分辨率
-            pdata['scanSpeed']=struct.unpack("f",block_data[40:44])[0] #扫描速度
-            pdata['logResolution']=struct.unpack("i",block_data[44:48])[0] #强度分辨率
-            pdata['dopplerResolution']=struct.unpack("i",block_data[48:52])[0] #多普勒分辨率
-            pdata['maximumRange']=struct.unpack("i",block_data[52:56])[0]##1 最大距离1
-            pdata['maximumRange']=struct.unpack("i",block_data[56:60])[0]##2 最大距离2
-            pdata['startRange']=struct.unpack("i",block_data[60:64])[0] #起始距离
-            pdata['sample']=struct.unpack("i",block_data[64:68])[0]##1 采样个数1
-            pdata['sample']=struct.unpack("i",block_data[68:72])[0]##2 采样个数2
-            pdata['phaseMode']=struct.unpack("i",block_data[72:76])[0] #相位编码模式
-            pdata['atmosphericLoss']=struct.unpack("f",block_data[76:80])[0] #大气衰减
-            pdata['nyquistSpeed']=struct.unpack("f",block_data[80:84])[0] #最大不模糊速度
-            pdata['momentsMask']=struct.unpack("l",block_data[84:92])[0] #数据类型掩码
-            pdata['momentsSizeMask']=struct.unpack("l",block_data[92:100])[0] #数据大小掩码
-            pdata['miscFilterMask']=struct.unpack("i",block_data[100:104])[0] #滤波设置掩码
-            pdata['sqiThreshold']=struct.unpack("f",block_data[104:108])[0] #SQI门限
-            pdata['sigThreshold']=struct.unpack("f",block_data[108:112])[0] #SIG门限
-            pdata['csrThreshold']=struct.unpack("f",block_data[112:116])[0] #CSR门限
-            pdata['logThreshold']=struct.unpack("f",block_data[116:120])[0] #LOG门限
-            pdata['cpaThreshold']=struct.unpack("f",block_data[120:124])[0] #CPA门限
-            pdata['pmiThreshold']=struct.unpack("f",block_data[124:128])[0] #PMI门限
-            pdata['dplogThreshold']=struct.unpack("f",block_data[128:132])[0] #PMI门限
-            pdata['thresholdsr']=struct.unpack("4s",block_data[132:136])[0] #阈值门限保留
-            pdata['dBTMask']=struct.unpack("i",block_data[136:140])[0] #dBT质控掩码
-            pdata['dBZMask']=struct.unpack("i",block_data[140:144])[0] #dBZ质控掩码
-            pdata['velocityMask']=struct.unpack("i",block_data[144:148])[0] #速度质控掩码
-            pdata['spectrumWidthMask']=struct.unpack("i",block_data[148:152])[0] #谱宽质控掩码
-            pdata['dpMask']=struct.unpack("i",block_data[152:156])[0] #偏振量质控掩码
-            pdata['maskReserved']=self.rhexgbk(struct.unpack("12s",block_data[156:168])[0]) #质控掩码保留位
-            pdata['reserved1']=self.rhexgbk(struct.unpack("4s",block_data[168:172])[0]) #扫描同步标志
-            pdata['direction']=struct.unpack("i",block_data[172:176])[0] #天线运行方向
-            pdata['groundClutterClassifierType']=struct.unpack("h",block_data[176:178])[0] #地物杂波图类型
-            pdata['groundClutterFilterType']=struct.unpack("h",block_data[178:180])[0] #地物滤波类型
-            pdata['groundClutterFilterNotchWidth']=struct.unpack("h",block_data[180:182])[0] #地物滤波宽度
-            pdata['groundClutterFilterWindow']=struct.unpack("h",block_data[182:184])[0] #滤波窗口类型
-            pdata['reserved2']=self.rhexgbk(struct.unpack("72s",block_data[184:256])[0]) #保留字段
+        # 扫描层配置信息，所有层一次读出后逐层解析
+        block_size=_CUT_CONF.size*self.data['common_block']['task_conf']['cutNumber']
+        block_data=buf[off:off+block_size]
+        off+=block_size
+        for values in _CUT_CONF.iter_unpack(block_data):
+            pdata=dict(zip(_CUT_CONF_KEYS,values))
+            pdata['maskReserved']=self.rhexgbk(pdata['maskReserved'])
+            pdata['reserved1']=self.rhexgbk(pdata['reserved1'])
+            pdata['reserved2']=self.rhexgbk(pdata['reserved2'])
             self.data['common_block']['cut_conf'].append(pdata)
-        # 径向数据
-        is_last_radial=False
-        while not is_last_radial:
-            # 径向头
-            block_data=f.read(64)
-            pdata={}
-            pdata['radialState']=struct.unpack("i",block_data[0:4])[0] #径向数据状态
-            pdata['spotBlank']=struct.unpack("i",block_data[4:8])[0] #消隐标志
-            pdata['sequenceNumber']=struct.unpack("i",block_data[8:12])[0] #序号
-            pdata['radialNumber']=struct.unpack("i",block_data[12:16])[0] #径向数
-            pdata['elevationNumber']=struct.unpack("i",block_data[16:20])[0] #仰角编号
-            pdata['azimuth']=struct.unpack("f",block_data[20:24])[0] #方位角
-            pdata['elevation']=struct.unpack("f",block_data[24:28])[0] #仰角
-            pdata['seconds']=struct.unpack("i",block_data[28:32])[0] #秒
-            pdata['microseconds']=struct.unpack("i",block_data[32:36])[0] #微秒
-            pdata['lengthofdata']=struct.unpack("i",block_data[36:40])[0] #数据长度
-            pdata['momentNumber']=struct.unpack("i",block_data[40:44])[0] #数据类别数量
-            pdata['reserved1']=struct.unpack("h",block_data[44:46])[0] #保留字段
-            pdata['horizontalEstimatedNoise']=struct.unpack("h",block_data[46:48])[0] #径向的水平估计噪声
-            pdata['verticalEstimatedNoise']=struct.unpack("h",block_data[48:50])[0] #径向的垂直估计噪声
-            pdata['zipType']=struct.unpack("c",block_data[50:51])[0] #压缩类型
-            pdata['reserved2']=self.rhexgbk(struct.unpack("13s",block_data[51:64])[0]) #保留字段
-            pdata['datahead']={}
-            for ri in range(pdata['momentNumber']):
-                # 径向数据头
-                block_data=f.read(32)
-                dh={}
-                dh['dataType']=struct.unpack("i",block_data[0:4])[0] #数据类型
-                dh['scale']=struct.unpack("i",block_data[4:8])[0] #比例
-                dh['offset']=struct.unpack("i",block_data[8:12])[0] #偏移
-                dh['binLength']=struct.unpack("h",block_data[12:14])[0] #库字节长度
-                dh['flags']=struct.unpack("h",block_data[14:16])[0] #标志
-                dh['length']=struct.unpack("i",block_data[16:20])[0] #长度
-                dh['reserved']=self.rhexgbk(struct.unpack("12s",block_data[20:32])[0]) #保留字段
-                # 径向数据计算
-                radial_numpy=f.read(dh['length'])
-                if dh['binLength']==1:
-                    radial_numpy=np.frombuffer(radial_numpy, dtype='u1').astype(float)
-                elif dh['binLength']==2:
-                    radial_numpy=np.frombuffer(radial_numpy, dtype='u2').astype(float)
-                else:
-                    raise RadarError("雷达格式手册未说明有binLength不属于[1,2]的情况，请核实!")
-                if dh['scale']>0:
-                    radial_numpy=(radial_numpy-dh['offset'])/dh['scale']
-                else:
-                    radial_numpy=(radial_numpy-dh['offset'])*dh['scale']
-                # 将数据存在data['radial']
-                datakey=self.get_datatype_byid(dh['dataType'])
-                if datakey not in self.data['radial'].keys():
-                    self.data['radial'][datakey]={
-                        'data':[],
-                        'dataLength':[],
-                        'radialState':[],
-                        'spotBlank':[],
-                        'sequenceNumber':[],
-                        'radialNumber':[],
-                        'elevationNumber':[],
-                        'azimuth':[],
-                        'elevation':[],
-                        'seconds':[],
-                        'microseconds':[],
-                        'horizontalEstimatedNoise':[],
-                        'verticalEstimatedNoise':[],
-                        'ppiElevation':[],
-                        'rhiAzimuth':[]
-                    }
-                self.data['radial'][datakey]['data'].append(radial_numpy)
-                self.data['radial'][datakey]['dataLength'].append(len(radial_numpy))
-                self.data['radial'][datakey]['radialState'].append(pdata['radialState'])
-                self.data['radial'][datakey]['spotBlank'].append(pdata['spotBlank'])
-                self.data['radial'][datakey]['sequenceNumber'].append(pdata['sequenceNumber'])
-                self.data['radial'][datakey]['radialNumber'].append(pdata['radialNumber'])
-                self.data['radial'][datakey]['elevationNumber'].append(pdata['elevationNumber'])
-                self.data['radial'][datakey]['azimuth'].append(pdata['azimuth'])
-                self.data['radial'][datakey]['elevation'].append(pdata['elevation'])
-                self.data['radial'][datakey]['seconds'].append(pdata['seconds'])
-                self.data['radial'][datakey]['microseconds'].append(pdata['microseconds'])
-                self.data['radial'][datakey]['horizontalEstimatedNoise'].append(pdata['horizontalEstimatedNoise'])
-                self.data['radial'][datakey]['verticalEstimatedNoise'].append(pdata['verticalEstimatedNoise'])
-#                 if self.data['common_block']['task_conf']['scanType'] in [0,1]:
-#                     ele=self.getStandardElevation(pdata['elevation'],self.data['common_block']['task_conf']['taskName'])
-#                     self.data['radial'][datakey]['ppiElevation'].append(ele)
-#                 else:
-#                     self.data['radial'][datakey]['rhiAzimuth'].append(self.data['common_block']['cut_conf'][pdata['elevationNumber']-1]['azimuth'])
-                # 径向数据头存储在此
-                dh['dataid']=len(self.data['radial'][datakey]['data'])-1 #数据存储位置
-                pdata['datahead'][datakey]=dh
-                
-            # 是否是最后一个径向数据，如果要退出循环了
-            if pdata['radialState']==4:
-                is_last_radial=True
+        # 径向数据：先顺序扫描出全部径向头与径向数据头的位置，再按数据类型整体解析
+        radial_offsets,moment_offsets,moment_radial,complete=_scan_radials(buf,off)
+        if not complete:
+            # 在径向头、径向数据头或库数据中被截断的文件整体拒绝，不读入残缺的径向
+            raise RadarError("雷达文件径向数据不完整(文件在径向数据块中被截断，共%d字节)，请核实!"%len(buf))
+        raw_bytes=np.frombuffer(buf,dtype=np.uint8)
+        radial_headers=self._gather_records(raw_bytes,radial_offsets,_RADIAL_HEADER)
+        moment_headers=self._gather_records(raw_bytes,moment_offsets,_MOMENT_HEADER)
+        if not np.isin(moment_headers['binLength'],list(_BIN_DTYPES)).all():
+            raise RadarError("雷达格式手册未说明有binLength不属于[1,2]的情况，请核实!")
+        # 数据类型按在文件中首次出现的顺序存入data['radial']
+        type_ids,first_index=np.unique(moment_headers['dataType'],return_index=True)
+        for typeid in type_ids[np.argsort(first_index)].tolist():
+            datakey=self.get_datatype_byid(typeid)
+            rows=np.flatnonzero(moment_headers['dataType']==typeid)
+            store=self._new_radial_store(buf,moment_offsets[rows]+_MOMENT_HEADER.itemsize,
+                                         moment_headers[rows],radial_headers[moment_radial[rows]])
+            if datakey in self.data['radial'].keys():
+                # 在已有数据之后继续追加
+                store=self._append_radial_store(self.data['radial'][datakey],store)
+            self._fill_standard_angles(store)
+            self.data['radial'][datakey]=store
+        self._build_cut_ranges()
                    
         return self.data
     
+    def _gather_records(self, raw_bytes, offsets, dtype):
+        """把raw_bytes中位于offsets处的定长数据块一次取出，解析为dtype类型的结构化数组"""
+        index = offsets[:, None] + np.arange(dtype.itemsize)
+        return raw_bytes[index].view(dtype)[:, 0]
+
+    def _new_radial_store(self, buf, data_offsets, moment_headers, radial_headers):
+        """
+        创建某一数据类型的径向存储
+
+        data为(径向数,库数)的二维数组，保存u1/u2原始计数，不足的库填0；
+        物理量需结合同一径向的scale、offset用_dequantize解码
+        """
+        bin_length = moment_headers['binLength'].astype(np.int64)
+        data_length = moment_headers['length'] // bin_length
+        dtype = _BIN_DTYPES[int(bin_length.max())]
+        data = np.zeros((len(moment_headers), int(data_length.max())), dtype=dtype)
+        if np.all(bin_length == dtype.itemsize):
+            _copy_bins(buf, data_offsets, data_length * dtype.itemsize, data.view(np.uint8))
+        else:
+            # 同一数据类型混有u1与u2时逐径向转换
+            for i, (start, n, bl) in enumerate(zip(data_offsets.tolist(), data_length.tolist(), bin_length.tolist())):
+                data[i, :n] = np.frombuffer(buf, dtype=_BIN_DTYPES[bl], count=n, offset=start)
+        store = {'data': data}
+        store['dataLength'] = data_length.astype(_RADIAL_FIELDS[0][1])
+        for key, typecode in _RADIAL_FIELDS[1:]:
+            store[key] = radial_headers[key].astype(typecode)
+        for key, typecode in _MOMENT_FIELDS:
+            store[key] = moment_headers[key].astype(typecode)
+        store['ppiElevation'] = []
+        store['rhiAzimuth'] = []
+        return store
+
+    def _append_radial_store(self, store, new_store):
+        """把new_store的径向接在store之后，返回合并后的存储"""
+        n, width = store['data'].shape
+        m, new_width = new_store['data'].shape
+        data = np.zeros((n + m, max(width, new_width)),
+                        dtype=np.promote_types(store['data'].dtype, new_store['data'].dtype))
+        data[:n, :width] = store['data']
+        data[n:, :new_width] = new_store['data']
+        new_store['data'] = data
+        for key, typecode in _RADIAL_FIELDS+_MOMENT_FIELDS:
+            new_store[key] = np.concatenate((store[key], new_store[key]))
+        return new_store
+
+    def _dequantize(self, raw_slice, scale, offset):
+        """将原始计数解码为物理量：scale>0时为(值-偏移)/比例，否则为(值-偏移)*比例"""
+        scale = np.asarray(scale, dtype=np.float64)
+        inv_scale = np.where(scale > 0, 1.0 / np.maximum(scale, 1), scale).astype(np.float32)
+        return (raw_slice.astype(np.float32) - np.asarray(offset, dtype=np.float32)) * inv_scale
+
+    def _fill_standard_angles(self, store):
+        """读取完成后批量计算PPI扫描径向的标准仰角，rhiAzimuth与原先一样不填充"""
+        task_conf=self.data['common_block']['task_conf']
+        if task_conf['scanType'] in [0,1]:
+            if task_conf['taskName'] in self.vcp_standard_elevation:
+                store['ppiElevation']=self.get_standard_elevation(store['elevation'],task_conf['taskName'])[1]
+
     def get_standard_elevation(self,elevation,vcp='VCP21D'):
         """
         获取标准仰角
@@ -516,15 +715,16 @@ class CinradReaderSTD():
         
         
         Parameters:
-        elevation (float): 射线真实角度
+        elevation (float or array_like): 射线真实角度，传入数组时逐个计算
         vcp (str): VCP模式
         
         Return:
         (layerid,elevation)
         """
-        std_list=self.vcp_standard_elevation[vcp]
-        position=np.argmin(np.abs(np.array(std_list)-elevation))
-        return (position+1,std_list[position])
+        std_arr=self.vcp_standard_elevation[vcp]
+        elevation=np.asarray(elevation)
+        position=np.argmin(np.abs(std_arr-elevation[...,None]),axis=-1)
+        return (position+1,std_arr[position])
     
     def get_standard_elevation_byid(self,layerid,vcp='VCP21D'):
         """
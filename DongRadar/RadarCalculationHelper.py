@@ -1,6 +1,40 @@
 # -*- coding:utf-8 -*-
+import math
 import numpy as np
 
+try:
+    import numba
+except ImportError:  # numba为可选依赖，未安装时使用纯numpy/math实现
+    numba = None
+
+
+def _njit(**kwargs):
+    """numba可用时用numba.njit编译函数，否则原样返回"""
+    if numba is None:
+        return lambda func: func
+    return numba.njit(**kwargs)
+
+_prange = range if numba is None else numba.prange
+
+
+@_njit(parallel=True, cache=True, fastmath=True)
+def _polar2cartesian_core(rho, theta, elev, pole_lat, pole_lon, out_lon, out_lat, out_h):
+    """polar2cartesian的编译内核，结果写入预先分配的(射线数,库数)数组"""
+    earth_rm = 8500  # 等效地球半径
+    for i in _prange(theta.size):
+        cos_t = math.cos(math.radians(theta[i]))
+        sin_t = math.sin(math.radians(theta[i]))
+        cos_e = math.cos(math.radians(elev[i]))
+        sin_e = math.sin(math.radians(elev[i]))
+        for j in range(rho.size):
+            x = cos_t * rho[j] * cos_e
+            y = sin_t * rho[j] * cos_e
+            lats = x / (111 * 1000) + pole_lat
+            out_lat[i, j] = lats
+            out_lon[i, j] = y / (111 * 1000 * math.cos(math.pi * lats / 180)) + pole_lon
+            out_h[i, j] = rho[j] * sin_e + rho[j] ** 2 / (2 * earth_rm * 1000)
+
+
 def polar2cartesian(rho_list, theta_list, elevation_list, pole=[0, 0]):
     '''
     将极坐标系转换为卡迪尔坐标系
@@ -9,29 +43,38 @@ def polar2cartesian(rho_list, theta_list, elevation_list, pole=[0, 0]):
 
     (极坐标单根射线坐标轴-极轴,极坐标弧度坐标轴,雷达层仰角,极点的经纬度坐标[latitude维度,longitude经度])    
     '''
-    latx = list()
-    lonx = list()
-    height = list()
-    earth_rm = 8500  # 等效地球半径
-    for i,theta in enumerate(theta_list):
-        for rho in rho_list:
-            #print("angle:%s,distance:%s,elev:%s"%(theta,rho,elevation))
-            x = np.cos(np.deg2rad(theta)) * rho * np.cos(np.deg2rad(elevation_list[i]))
-            y = np.sin(np.deg2rad(theta)) * rho * np.cos(np.deg2rad(elevation_list[i]))
-            deltalat = x / (111 * 1000)  # 球面弧度距离转角度值，111为1度对应的弧度
-            lats = deltalat + pole[0]
-            # deltalon = y / (111 * 1000)  # 直接用111则与天水雷达生成的图不一致（漳县回波偏东）
-            deltalon = y / (111 * 1000 * np.cos(np.pi*lats/180)) #用维度修正距离之后绘制的图不再是原型，而是越往两极越扩大的类椭圆
-            lons = deltalon + pole[1]
-            h = rho * np.sin(np.deg2rad(elevation_list[i])) + rho ** 2 / (2 * earth_rm * 1000)  
-            latx.append(lats)
-            lonx.append(lons)
-            height.append(h)
-    return np.array(lonx), np.array(latx), np.array(height)
+    theta = np.asarray(theta_list, dtype=np.float64)
+    elev = np.asarray(elevation_list, dtype=np.float64)
+    rho = np.asarray(rho_list, dtype=np.float64)
+    if theta.shape != elev.shape:
+        raise ValueError("theta_list与elevation_list长度不一致")
+    if numba is not None:
+        out_lon = np.empty((theta.size, rho.size))
+        out_lat = np.empty((theta.size, rho.size))
+        out_h = np.empty((theta.size, rho.size))
+        _polar2cartesian_core(rho, theta, elev, float(pole[0]), float(pole[1]), out_lon, out_lat, out_h)
+        return out_lon.ravel(), out_lat.ravel(), out_h.ravel()
 
+    earth_rm = 8500  # 等效地球半径
+    # 按射线(theta)为行、距离库(rho)为列进行广播计算，展平后的顺序与逐点循环一致
+    theta = np.deg2rad(theta)
+    elev = np.deg2rad(elev)
+    cos_e = np.cos(elev)[:, None]
+    sin_e = np.sin(elev)[:, None]
+    cos_t = np.cos(theta)[:, None]
+    sin_t = np.sin(theta)[:, None]
+    x = cos_t * rho * cos_e
+    y = sin_t * rho * cos_e
+    deltalat = x / (111 * 1000)  # 球面弧度距离转角度值，111为1度对应的弧度
+    lats = deltalat + pole[0]
+    # deltalon = y / (111 * 1000)  # 直接用111则与天水雷达生成的图不一致（漳县回波偏东）
+    deltalon = y / (111 * 1000 * np.cos(np.pi*lats/180)) #用维度修正距离之后绘制的图不再是原型，而是越往两极越扩大的类椭圆
+    lons = deltalon + pole[1]
+    h = rho * sin_e + rho ** 2 / (2 * earth_rm * 1000)
+    return lons.ravel(), lats.ravel(), h.ravel()
 
-import math
 
+@_njit(cache=True, fastmath=True)
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
     使用Haversine公式计算两个经纬度点之间的球面距离。
@@ -47,7 +90,10 @@ def haversine_distance(lat1, lon1, lat2, lon2):
         两点之间的球面距离（公里）。
     """
     # 将经纬度转换为弧度
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
 
     # 计算纬度和经度的差值
     delta_lat = lat2 - lat1
@@ -63,6 +109,7 @@ def haversine_distance(lat1, lon1, lat2, lon2):
 
     return distance
 
+@_njit(cache=True, fastmath=True)
 def calculate_bearing(lat1, lon1, lat2, lon2):
     """
     计算两个经纬度点之间的方位角。
@@ -78,15 +125,85 @@ def calculate_bearing(lat1, lon1, lat2, lon2):
         两点之间的方位角（度）。
     """
     # 将经纬度转换为弧度
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    lat1 = math.radians(lat1)
+    lon1 = math.radians(lon1)
+    lat2 = math.radians(lat2)
+    lon2 = math.radians(lon2)
 
     # 计算经度和纬度的差值
     delta_lon = lon2 - lon1
 
-    # 使用 atan2 来计算方位角
-    bearing = math.degrees(math.atan2(math.sin(delta_lon), math.cos(lat1) * math.tan(lat2) - math.sin(lat1) * math.cos(delta_lon)))
+    # 使用 atan2 来计算方位角(标准形式，避免tan(lat2)在两极处发散)
+    bearing = math.degrees(math.atan2(math.sin(delta_lon) * math.cos(lat2),
+                                      math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(delta_lon)))
 
     # 将方位角转换为 0-360 度的范围
     bearing = (bearing + 360) % 360
 
-    return bearing
\ No newline at end of file
+    return bearing
+
+if numba is not None:
+    # 由标量内核生成的numpy ufunc，首次调用时编译。
+    # 不使用cache=True：与同一py_func的njit版本共用缓存文件名，先后加载两者会导致解释器崩溃
+    _haversine_ufunc = numba.vectorize(haversine_distance.py_func)
+    _bearing_ufunc = numba.vectorize(calculate_bearing.py_func)
+
+def haversine_distance_vec(lat1, lon1, lat2, lon2):
+    """
+    haversine_distance的数组版本，一次计算多组经纬度点之间的球面距离。
+
+    单点查询仍建议使用haversine_distance（math标量计算更快）。
+
+    参数:
+    lat1, lon1 : float or array_like
+        第一组点的纬度和经度（十进制度数）。
+    lat2, lon2 : float or array_like
+        第二组点的纬度和经度（十进制度数），与第一组按numpy规则广播。
+
+    返回:
+    numpy.ndarray
+        两点之间的球面距离（公里）。
+    """
+    if numba is not None:
+        return _haversine_ufunc(*[np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2)])
+
+    # 将经纬度转换为弧度
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+
+    # 应用Haversine公式
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    # 地球平均半径，单位公里
+    R = 6371.0
+    return R * c
+
+def calculate_bearing_vec(lat1, lon1, lat2, lon2):
+    """
+    calculate_bearing的数组版本，一次计算多组经纬度点之间的方位角。
+
+    参数:
+    lat1, lon1 : float or array_like
+        第一组点的纬度和经度（十进制度数）。
+    lat2, lon2 : float or array_like
+        第二组点的纬度和经度（十进制度数），与第一组按numpy规则广播。
+
+    返回:
+    numpy.ndarray
+        两点之间的方位角（度，0-360）。
+    """
+    if numba is not None:
+        return _bearing_ufunc(*[np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2)])
+
+    # 将经纬度转换为弧度
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+
+    # 计算经度的差值
+    delta_lon = lon2 - lon1
+
+    # 使用 atan2 来计算方位角(标准形式，与calculate_bearing一致)
+    bearing = np.degrees(np.arctan2(np.sin(delta_lon) * np.cos(lat2),
+                                    np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(delta_lon)))
+
+    # 将方位角转换为 0-360 度的范围
+    return (bearing + 360) % 360
@@ -1,182 +1,165 @@
 # -*- coding:utf-8 -*-
+import copy
+import itertools
 import os
 import numpy as np
 import matplotlib as mpl
+import matplotlib.colors as cmx
 import matplotlib.pyplot as plt
 # plt.switch_backend('agg')
 
-def radar_colormap(colortable_type="Z", proportion=True, sep=False, spacing='c'):
+#中国局雷达数据颜色表，结构为[[value, R, G, B],[]]
+_DBZ_TABLE = np.array([
+    [0,255,255,255],
+    [5,192,192,254],
+    [10,122,114,238],
+    [15,30, 38, 208],
+    [20,166, 252,168],
+    [25,0, 234, 0],
+    [30,16, 146, 26],
+    [35,252,244,100],
+    [40,200, 200, 2],
+    [45,140,140,0],
+    [50,254,172,172],
+    [55,254,100,84],
+    [60,238,2,48],
+    [65,212,142,254],
+    [70,170,36,250]
+    ], dtype=np.float64)
+_W_TABLE = np.array([
+    [0,255,255,255],
+    [0.04,0,107,253],
+    [0.08,0,186,253],
+    [0.12,111,248,255],
+    [0.16,0,150,50],
+    [0.20,0,220,0],
+    [0.23,180,255,180],
+    [0.26,196,166,0],
+    [0.29,255,255,0],
+    [0.32,238,255,0],
+    [0.35,255,0,0],
+    [0.38,255,100,100],
+    [0.41,255,180,180],
+    [0.44,150,0,180],
+    [0.47,200,100,155],
+    [0.50,241,98,153]
+    ], dtype=np.float64)
+_V_TABLE = np.array([
+    [-30,126,224,254],
+    [-27,0,224,254],
+    [-20,0,176,176],
+    [-15,0,254,0],
+    [-10,0,196,0],
+    [-5,0,128,0],
+    [-1,254,254,254],
+    [0,252,252,252],
+    [1,254,0,0],
+    [5,254,88,88],
+    [10,254,176,176],
+    [15,254,124,0],
+    [20,255,210,0],
+    [27,254,254,0]
+    ], dtype=np.float64)
+for _table in (_DBZ_TABLE, _W_TABLE, _V_TABLE):
+    assert np.all((_table[:, 1:4] >= 0) & (_table[:, 1:4] <= 255)), 'RGB分量需在0~255之间'
+
+def _split_table(arr):
+    '''把颜色表拆分为数值列与0~1的RGB三列，数值需按升序排列'''
+    value = arr[:, 0]
+    if np.any(np.diff(value) < 0):
+        raise ValueError('Values must be in order')
+    rgb = arr[:, 1:4] / 255
+    return value, rgb
+
+def _build_v_segments(value, rgb):
+    '''
+    计算按值分块(sep=True, spacing='v')时的颜色节点位置与节点颜色
+
+    每个颜色块由起点与下一个值之前(减1e-5)两个节点组成，最后一块以1结束，共2N-1个节点
+    '''
+    drange = value[-1] - value[0]
+    x = np.empty(2 * len(value) - 1)
+    x[0::2] = np.r_[(value[:-1] - value[0]) / drange, 1]
+    x[1::2] = (value[1:] - value[0] - 1e-5) / drange
+    return x, np.repeat(rgb, 2, axis=0)[:len(x)]
+
+def _interp_lut(x, rgb, n=256):
+    '''由节点位置x(0~1)与各节点颜色rgb线性插值出n个等距颜色，结果与LinearSegmentedColormap的查找表一致'''
+    xs = np.linspace(0, 1, n)
+    return np.stack([np.interp(xs, x, c) for c in rgb.T], axis=1)
+
+def _radar_colormap_uncached(colortable_type="Z", proportion=True, sep=False, spacing='c'):
     '''
     根据给定的numpy_array矩阵，返回colormap。
 
     numpy_array: string
         numpy_array矩阵,结构如下: [[value, R, G, B],[]]
     proportion: boolean, default is True 比例，使得均衡
-        proportion为True时LinearSegmentedColormap将由输入值给出
+        proportion为True时颜色节点的位置将由输入值给出；
+        为False时第i个颜色节点位于i/N处(N为颜色数)，最后1/N保持最后一种颜色
+        (原先LinearSegmentedColormap要求节点以1结束，此时会抛出ValueError)
     sep: boolean, default is False
         当sep为真时，colormap将设置为颜色块，没有颜色梯度变化
     spacing: string, 默认为'c', 仅仅当sep为False时可用
         When spacing is 'c', the color blocks will be equally spaced.
         A ListedColormap will be returned.颜色块将被等距隔开
         When spacing is 'v', the length of color blocks will be based
-        on the input values. A LinearSegmentedColormap will be returned.
+        on the input values. A ListedColormap of 256 interpolated colors will be returned.
         颜色块的长度将基于输入值
     '''
-    import numpy as np
-    import matplotlib.colors as cmx
     if colortable_type not in ["dBZ","W","V"]:
         raise ValueError("colortable_type not in [dBZ,W,V]")
     #中国局雷达数据颜色表
     arr = None
     if colortable_type=="dBZ":
-        arr = np.array([
-            [0,255,255,255],
-            [5,192,192,254],
-            [10,122,114,238],
-            [15,30, 38, 208],
-            [20,166, 252,168],
-            [25,0, 234, 0],
-            [30,16, 146, 26],
-            [35,252,244,100],
-            [40,200, 200, 2],
-            [45,140,140,0],
-            [50,254,172,172],
-            [55,254,100,84],
-            [60,238,2,48],
-            [65,212,142,254],
-            [70,170,36,250]
-            ])
+        arr = _DBZ_TABLE
     if colortable_type=="W":
-        arr = np.array([
-            [0,255,255,255],
-            [0.04,0,107,253],
-            [0.08,0,186,253],
-            [0.12,111,248,255],
-            [0.16,0,150,50],
-            [0.20,0,220,0],
-            [0.23,180,255,180],
-            [0.26,196,166,0],
-            [0.29,255,255,0],
-            [0.32,238,255,0],
-            [0.35,255,0,0],
-            [0.38,255,100,100],
-            [0.41,255,180,180],
-            [0.44,150,0,180],
-            [0.47,200,100,155],
-            [0.50,341,98,153]
-            ])
+        arr = _W_TABLE
     if colortable_type=="V":
-        arr = np.array([
-            [-30,126,224,254],
-            [-27,0,224,254],
-            [-20,0,176,176],
-            [-15,0,254,0],
-            [-10,0,196,0],
-            [-5,0,128,0],
-            [-1,254,254,254],
-            [0,252,252,252],
-            [1,254,0,0],
-            [5,254,88,88],
-            [10,254,176,176],
-            [15,254,124,0],
-            [20,255,210,0],
-            [27,254,254,0]
-            ])
-    inidict = {'red':None, 'green':None, 'blue':None}
+        arr = _V_TABLE
     if sep == True:
         if spacing == 'c':
-            ar1 = arr.transpose()
-            value = []
-            count = 0
-            while count < len(ar1[1]):
-                value.append((int(ar1[1][count]) / 255, int(ar1[2][count]) / 255,
-                              int(ar1[3][count]) / 255))
-                count = count + 1
-            return cmx.ListedColormap(value, 256)
+            # 每个颜色块一种颜色，颜色数即为颜色表的行数
+            return cmx.ListedColormap(arr[:, 1:4] / 255)
         elif spacing == 'v':
-            value = []
-            r = []
-            g = []
-            b = []
-            for i in arr:
-                value.append(float(i[0]))
-                r.append(int(i[1]) / 255)
-                g.append(int(i[2]) / 255)
-                b.append(int(i[3]) / 255)
-                if len(value) > 1:
-                    if value[-1] < value[-2]:
-                        raise ValueError('Values must be in order')
-            inivalue = value[0]
-            maxvalue = value[-1]
-            drange = maxvalue - inivalue
-            rpart = []
-            gpart = []
-            bpart = []
-            count = 0
-            try:
-                while count < len(value):
-                    tupr = ((value[count] - inivalue) / drange, r[count], r[count])
-                    tupg = ((value[count] - inivalue) / drange, g[count], g[count])
-                    tupb = ((value[count] - inivalue) / drange, b[count], b[count])
-                    tupra = ((value[count + 1] - inivalue-1e-5) / drange, r[count], r[count])
-                    tupga = ((value[count + 1] - inivalue-1e-5) / drange, g[count], g[count])
-                    tupba = ((value[count + 1] - inivalue-1e-5) / drange, b[count], b[count])
-                    rpart.append(tupr)
-                    rpart.append(tupra)
-                    gpart.append(tupg)
-                    gpart.append(tupga)
-                    bpart.append(tupb)
-                    bpart.append(tupba)
-                    count=count+1
-            except IndexError:
-                rpart.append((1, r[count], r[count]))
-                gpart.append((1, g[count], g[count]))
-                bpart.append((1, b[count], b[count]))
-            inidict['red'] = rpart
-            inidict['green'] = gpart
-            inidict['blue'] = bpart
-            return cmx.LinearSegmentedColormap('my_colormap', inidict, 256)
+            return cmx.ListedColormap(_interp_lut(*_build_v_segments(*_split_table(arr))), 'my_colormap')
 
     elif sep == False:
-        value = []
-        r = []
-        g = []
-        b = []
-        for i in arr:
-            value.append(float(i[0]))
-            r.append(int(i[1]) / 255)
-            g.append(int(i[2]) / 255)
-            b.append(int(i[3]) / 255)
-            if len(value) > 1:
-                if value[-1] < value[-2]:
-                    raise ValueError('Values must be in order')
-        inivalue = value[0]
-        maxvalue = value[-1]
-        drange = maxvalue-inivalue
-        rpart = []
-        gpart = []
-        bpart = []
+        value, rgb = _split_table(arr)
         if proportion == True:
-            count = 0
-            while count < len(value):
-                tupr = ((value[count] - inivalue) / drange, r[count], r[count])
-                tupg = ((value[count] - inivalue) / drange, g[count], g[count])
-                tupb = ((value[count] - inivalue) / drange, b[count], b[count])
-                rpart.append(tupr)
-                gpart.append(tupg)
-                bpart.append(tupb)
-                count=count + 1
+            x = (value - value[0]) / (value[-1] - value[0])
         elif proportion == False:
-            count = 0
-            while count < len(value):
-                tupr = (count / len(value), r[count], r[count])
-                tupg = (count / len(value), g[count], g[count])
-                tupb = (count / len(value), b[count], b[count])
-                rpart.append(tupr)
-                gpart.append(tupg)
-                bpart.append(tupb)
-                count = count + 1
-        inidict['red'] = rpart
-        inidict['green'] = gpart
-        inidict['blue'] = bpart
-        return cmx.LinearSegmentedColormap('my_colormap', inidict, 256)
\ No newline at end of file
+            x = np.arange(len(value)) / len(value)
+        return cmx.ListedColormap(_interp_lut(x, rgb), 'my_colormap')
+
+# 颜色表为常量，导入时即构建所有参数组合的colormap
+_CMAP_CACHE = {
+    key: _radar_colormap_uncached(*key)
+    for key in itertools.product(["dBZ","W","V"], [True, False], [True, False], ['c', 'v'])
+}
+# 默认参数的三种colormap，为缓存的副本，修改它们不影响radar_colormap的返回值
+CMAP_DBZ = copy.copy(_CMAP_CACHE[("dBZ", True, False, 'c')])
+CMAP_W = copy.copy(_CMAP_CACHE[("W", True, False, 'c')])
+CMAP_V = copy.copy(_CMAP_CACHE[("V", True, False, 'c')])
+
+def register_colormaps():
+    '''
+    将默认参数的三种colormap注册到matplotlib，之后可直接以名称使用，例如imshow(..., cmap='dBZ_radar')
+
+    注册名为dBZ_radar、W_radar、V_radar，已注册的名称不重复注册。需要matplotlib>=3.5
+    '''
+    for name, key in (('dBZ_radar', "dBZ"), ('W_radar', "W"), ('V_radar', "V")):
+        if name not in mpl.colormaps:
+            mpl.colormaps.register(radar_colormap(key), name=name)
+
+def radar_colormap(colortable_type="Z", proportion=True, sep=False, spacing='c'):
+    '''
+    根据颜色表类型返回colormap，参数同_radar_colormap_uncached。
+
+    返回导入时预先构建的colormap的副本，调用方修改(如set_bad)不影响缓存。
+    '''
+    key = (colortable_type, proportion, sep, spacing)
+    if key not in _CMAP_CACHE:
+        # 不在预构建范围内的参数(如不支持的colortable_type)按原方式处理
+        return _radar_colormap_uncached(*key)
+    return copy.copy(_CMAP_CACHE[key])
\ No newline at end of file
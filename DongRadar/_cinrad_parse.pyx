@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# cython: language_level=3, boundscheck=False, wraparound=False
+# ===========================================================================
+# Filename: _cinrad_parse.pyx
+# Description: C extension for scanning radial blocks of CINRAD STD files
+#
+# Author: Dong Hongchang
+# Email: dsg327@163.com
+# License: MIT License
+#
+# Copyright (c) 2023 DongHc
+# ===========================================================================
+
+"""
+径向数据块解析的C扩展
+
+径向数据块中每条径向的长度由其径向头与径向数据头决定，只能顺序扫描，这部分在此用C实现。
+未编译时CinradReaderSTD使用等价的纯Python实现(_scan_radials_py、_copy_bins_py)。
+"""
+
+import numpy as np
+
+from libc.stdint cimport int32_t, int64_t, uint32_t
+from libc.string cimport memcpy
+
+cdef enum:
+    RADIAL_HEADER_SIZE = 64 #径向头字节数
+    MOMENT_HEADER_SIZE = 32 #径向数据头字节数
+    RADIAL_STATE_POS = 0 #径向头中radialState的位置
+    MOMENT_NUMBER_POS = 40 #径向头中momentNumber的位置
+    MOMENT_LENGTH_POS = 16 #径向数据头中length的位置
+    LAST_RADIAL_STATE = 4 #体扫结束径向的radialState
+
+
+cdef inline int32_t _read_int32(const unsigned char[::1] buf, Py_ssize_t pos) noexcept nogil:
+    """按小端读取4字节有符号整数"""
+    return <int32_t>(<uint32_t>buf[pos] | (<uint32_t>buf[pos+1] << 8)
+                     | (<uint32_t>buf[pos+2] << 16) | (<uint32_t>buf[pos+3] << 24))
+
+
+cdef Py_ssize_t _walk(const unsigned char[::1] buf, Py_ssize_t off,
+                      int64_t* radial_offsets, int64_t* moment_offsets, int64_t* moment_radial,
+                      Py_ssize_t* radial_count, Py_ssize_t* moment_count) noexcept nogil:
+    """
+    从off开始顺序扫描径向，直到radialState为4的径向结束
+
+    位置数组为NULL时只计数。返回径向数据块结束位置，数据不完整时返回-1
+    """
+    cdef Py_ssize_t size = buf.shape[0]
+    cdef Py_ssize_t nr = 0, nm = 0
+    cdef int32_t state, moment_number, length, i
+    while True:
+        if off + RADIAL_HEADER_SIZE > size:
+            return -1
+        if radial_offsets != NULL:
+            radial_offsets[nr] = off
+        state = _read_int32(buf, off + RADIAL_STATE_POS)
+        moment_number = _read_int32(buf, off + MOMENT_NUMBER_POS)
+        off += RADIAL_HEADER_SIZE
+        for i in range(moment_number):
+            if off + MOMENT_HEADER_SIZE > size:
+                return -1
+            if moment_offsets != NULL:
+                moment_offsets[nm] = off
+                moment_radial[nm] = nr
+            length = _read_int32(buf, off + MOMENT_LENGTH_POS)
+            if length < 0:
+                return -1
+            off += MOMENT_HEADER_SIZE + length
+            if off > size:
+                return -1
+            nm += 1
+        nr += 1
+        if state == LAST_RADIAL_STATE:
+            break
+    radial_count[0] = nr
+    moment_count[0] = nm
+    return off
+
+
+def scan_radials(const unsigned char[::1] buf, Py_ssize_t offset):
+    """
+    扫描径向数据块，获得各径向头与径向数据头的位置
+
+    Return:
+    (radial_offsets,moment_offsets,moment_radial,complete)
+    moment_radial为各径向数据头所属径向的序号，complete为False时数据不完整
+    """
+    cdef Py_ssize_t nr = 0, nm = 0, end
+    cdef int64_t[::1] r, m, p
+    with nogil:
+        end = _walk(buf, offset, NULL, NULL, NULL, &nr, &nm)
+    if end < 0:
+        empty = np.empty(0, dtype=np.int64)
+        return (empty, empty, empty, False)
+    radial_offsets = np.empty(nr, dtype=np.int64)
+    moment_offsets = np.empty(nm, dtype=np.int64)
+    moment_radial = np.empty(nm, dtype=np.int64)
+    r = radial_offsets
+    m = moment_offsets
+    p = moment_radial
+    with nogil:
+        if nm > 0:
+            _walk(buf, offset, &r[0], &m[0], &p[0], &nr, &nm)
+        else:
+            _walk(buf, offset, &r[0], NULL, NULL, &nr, &nm)
+    return (radial_offsets, moment_offsets, moment_radial, True)
+
+
+def copy_bins(const unsigned char[::1] buf, const int64_t[::1] src, const int64_t[::1] nbytes,
+              unsigned char[:, ::1] out):
+    """把buf中从src[i]开始的nbytes[i]个字节拷贝到out第i行的开头"""
+    cdef Py_ssize_t i, n = src.shape[0]
+    if nbytes.shape[0] != n or out.shape[0] != n:
+        raise ValueError("src、nbytes与out的行数不一致")
+    for i in range(n):
+        if nbytes[i] < 0 or nbytes[i] > out.shape[1] or src[i] < 0 or src[i] + nbytes[i] > buf.shape[0]:
+            raise ValueError("第%d条径向数据超出了范围" % i)
+    with nogil:
+        for i in range(n):
+            if nbytes[i] > 0:
+                memcpy(&out[i, 0], &buf[src[i]], nbytes[i])
@@ -1,4 +1,4 @@
-from setuptools import setup, find_packages
+from setuptools import setup, find_packages, Extension
 
 # 项目的元数据
 NAME = "DongRadar"
@@ -12,9 +12,24 @@ LICENSE = "MIT"
 # 项目依赖
 REQUIRED = [
     "numpy",
-    "struct",
-    "pathlib",
+    "matplotlib",
 ]
+# 可选依赖：numba加速坐标与距离计算，indexed_bzip2多线程解压bz2文件
+EXTRAS = {
+    "jit": ["numba"],
+    "bz2": ["indexed_bzip2"],
+}
+
+# 可选的C扩展：pip安装时按pyproject.toml自动准备Cython并编译径向数据解析的C实现，
+# 编译失败或直接运行setup.py且未安装Cython时使用纯Python实现
+try:
+    from Cython.Build import cythonize
+    EXT_MODULES = cythonize(
+        [Extension("DongRadar._cinrad_parse", ["DongRadar/_cinrad_parse.pyx"], optional=True)],
+        language_level=3,
+    )
+except ImportError:
+    EXT_MODULES = []
 
 # 读取 README 文件作为长描述
 with open("README.md", "r", encoding="utf-8") as f:
@@ -31,7 +46,9 @@ setup(
     url=URL,
     license=LICENSE,
     packages=find_packages(),
+    ext_modules=EXT_MODULES,
     install_requires=REQUIRED,
+    extras_require=EXTRAS,
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
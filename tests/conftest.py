@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""未安装DongRadar时直接使用仓库中的源码运行测试"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""CinradReaderSTD读取与查询检查，使用struct.pack构造的小型标准格式文件"""
+
+import numpy as np
+import pytest
+
+from DongRadar import CinradReaderSTD as R
+
+_SITE_LAT = 35.0
+_SITE_LON = 104.0
+_KU_LENGTH = 250
+_AZIMUTHS = (0.0, 90.0, 180.0, 270.0)
+_BINS = 10
+
+
+def _pack(st, keys, **values):
+    '''以全0为默认值按字段名打包一个数据块，keys中重复的字段名同时赋值'''
+    fields = list(st.unpack(bytes(st.size)))
+    for i, key in enumerate(keys):
+        if key in values:
+            fields[i] = values[key]
+    return st.pack(*fields)
+
+
+def _moment(typeid, counts, bin_length, scale=2, offset=64):
+    '''径向数据头与库数据'''
+    dtype = R._BIN_DTYPES[bin_length]
+    data = np.asarray(counts, dtype=dtype).tobytes()
+    header = np.zeros(1, dtype=R._MOMENT_HEADER)
+    header['dataType'] = typeid
+    header['scale'] = scale
+    header['offset'] = offset
+    header['binLength'] = bin_length
+    header['length'] = len(data)
+    return header.tobytes() + data
+
+
+def _radial(cutid, azimuth, moments, last=False):
+    '''径向头与其所有径向数据'''
+    header = np.zeros(1, dtype=R._RADIAL_HEADER)
+    header['radialState'] = 4 if last else 1
+    header['elevationNumber'] = cutid
+    header['azimuth'] = azimuth
+    header['elevation'] = 0.5
+    header['lengthofdata'] = sum(len(m) for m in moments)
+    header['momentNumber'] = len(moments)
+    return header.tobytes() + b''.join(moments)
+
+
+def _counts(cutid, ri, n=_BINS):
+    '''第cutid层第ri条径向的原始计数，各库不同以便核对位置'''
+    return [100 + 20 * cutid + 4 * ri + b for b in range(n)]
+
+
+def _std_file(cut_number=2):
+    '''
+    构造体扫文件：每层4条径向，dBZ为u1；V在第1层为u1、其余层为u2；
+    第1层方位角90°的dBZ径向只有5个库
+    '''
+    parts = [
+        _pack(R._GENERIC_HEADER, R._GENERIC_HEADER_KEYS, magicNumber=b'RSTM', genericType=1),
+        _pack(R._SITE_CONF, R._SITE_CONF_KEYS, siteCode=b'Z9999', latitude=_SITE_LAT, longitude=_SITE_LON),
+        _pack(R._TASK_CONF, R._TASK_CONF_KEYS, taskName=b'VCP21D', scanType=1, cutNumber=cut_number),
+    ]
+    parts += [_pack(R._CUT_CONF, R._CUT_CONF_KEYS, logResolution=_KU_LENGTH, dopplerResolution=_KU_LENGTH)
+              for _ in range(cut_number)]
+    for cutid in range(1, cut_number + 1):
+        for ri, azimuth in enumerate(_AZIMUTHS):
+            n = 5 if (cutid, ri) == (1, 1) else _BINS
+            v_length = 1 if cutid == 1 else 2
+            v_counts = [c * 10 if v_length == 2 else c for c in _counts(cutid, ri)]
+            moments = [_moment(2, _counts(cutid, ri, n), 1), _moment(3, v_counts, v_length)]
+            parts.append(_radial(cutid, azimuth, moments, last=(cutid, ri) == (cut_number, 3)))
+    return b''.join(parts)
+
+
+@pytest.fixture
+def std_path(tmp_path):
+    path = tmp_path / 'Z9999.STD.bin'
+    path.write_bytes(_std_file())
+    return path
+
+
+def _north(distance):
+    '''雷达站正北distance米处的经纬度'''
+    return _SITE_LAT + np.degrees(distance / 6371000.0), _SITE_LON
+
+
+def test_values_bylatlon_includes_last_cut(std_path):
+    reader = R.CinradReaderSTD(str(std_path))
+    lat, lon = _north(4.5 * _KU_LENGTH)
+    result = reader.get_values_bylatlon(lat, lon)
+    assert len(result['value']) == 2
+    np.testing.assert_allclose(result['value'], [(_counts(c, 0)[4] - 64) / 2 for c in (1, 2)])
+
+
+def test_values_bylatlon_batch_accepts_grid(std_path):
+    reader = R.CinradReaderSTD(str(std_path))
+    lat, lon = _north(4.5 * _KU_LENGTH)
+    lats, lons = np.meshgrid([lat, _SITE_LAT], [lon, lon, lon], indexing='ij')
+    results = reader.get_values_bylatlon_batch(lats, lons, 'V')
+    assert len(results) == lats.size
+    for i, (la, lo) in enumerate(zip(lats.ravel(), lons.ravel())):
+        assert results[i] == reader.get_values_bylatlon(la, lo, 'V')
+    with pytest.raises(ValueError):
+        reader.get_values_bylatlon_batch([lat, lat], [lon], 'V')
+
+
+@pytest.mark.parametrize("cut", [3, R._MOMENT_HEADER.itemsize + 4, 100])
+def test_truncated_radial_block_raises(tmp_path, cut):
+    path = tmp_path / 'truncated.bin'
+    path.write_bytes(_std_file()[:-cut])
+    with pytest.raises(R.RadarError):
+        R.CinradReaderSTD(str(path))
+
+
+def test_read_data_stores_raw_counts(std_path):
+    reader = R.CinradReaderSTD(str(std_path))
+    assert list(reader.get_all_datatype()) == ['dBZ', 'V']
+    store = reader.get_data()['radial']['dBZ']
+    assert store['data'].dtype == np.uint8
+    assert store['data'].shape == (8, _BINS)
+    np.testing.assert_array_equal(store['dataLength'], [10, 5, 10, 10, 10, 10, 10, 10])
+    np.testing.assert_array_equal(store['data'][1], _counts(1, 1, 5) + [0] * 5)
+    assert reader.get_cut_data_index(2, 'dBZ') == (4, 8)
+
+
+def test_mixed_bin_length_is_widened(std_path):
+    reader = R.CinradReaderSTD(str(std_path))
+    store = reader.get_data()['radial']['V']
+    assert store['data'].dtype == np.dtype('<u2')
+    for cutid in (1, 2):
+        for ri in range(len(_AZIMUTHS)):
+            expected = _counts(cutid, ri) if cutid == 1 else [c * 10 for c in _counts(cutid, ri)]
+            np.testing.assert_array_equal(store['data'][(cutid - 1) * 4 + ri], expected)
+
+
+def test_query_past_short_radial_returns_none(std_path):
+    reader = R.CinradReaderSTD(str(std_path))
+    # 方位角90°的径向只有5个库，第7个库在该径向上无效，在其他径向上有效
+    assert reader.get_value_bypolar(6.5 * _KU_LENGTH, 90.0, 1) is None
+    height, value = reader.get_value_bypolar(6.5 * _KU_LENGTH, 0.0, 1)
+    assert value == pytest.approx((_counts(1, 0)[6] - 64) / 2)
+    height, value = reader.get_value_bypolar(3.5 * _KU_LENGTH, 90.0, 1)
+    assert value == pytest.approx((_counts(1, 1)[3] - 64) / 2)
+
+
+def test_scan_and_copy_match_python_fallback():
+    ext = pytest.importorskip("DongRadar._cinrad_parse")
+    buf = _std_file()
+    off = R._GENERIC_HEADER.size + R._SITE_CONF.size + R._TASK_CONF.size + 2 * R._CUT_CONF.size
+    expected = R._scan_radials_py(buf, off)
+    result = ext.scan_radials(buf, off)
+    assert result[3] is True and expected[3] is True
+    for a, b in zip(result[:3], expected[:3]):
+        np.testing.assert_array_equal(a, b)
+
+    src = expected[1] + R._MOMENT_HEADER.itemsize
+    nbytes = np.full(src.shape, 5, dtype=np.int64)
+    out_c = np.zeros((src.size, 8), dtype=np.uint8)
+    out_py = np.zeros((src.size, 8), dtype=np.uint8)
+    ext.copy_bins(buf, src, nbytes, out_c)
+    R._copy_bins_py(buf, src, nbytes, out_py)
+    np.testing.assert_array_equal(out_c, out_py)
+
+    # 截断的数据两种实现都报告不完整
+    assert ext.scan_radials(buf[:-3], off)[3] is False
+    assert R._scan_radials_py(buf[:-3], off)[3] is False
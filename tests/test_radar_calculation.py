@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""RadarCalculationHelper坐标与距离计算检查"""
+
+import math
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from DongRadar import RadarCalculationHelper as C
+
+_POLE = [35.0, 104.0]
+
+
+@pytest.fixture
+def no_numba(monkeypatch):
+    '''强制使用纯numpy实现'''
+    monkeypatch.setattr(C, 'numba', None)
+
+
+def _polar2cartesian_loop(rho_list, theta_list, elevation_list, pole):
+    '''原先逐射线、逐库循环的实现，作为参考结果'''
+    latx, lonx, height = [], [], []
+    earth_rm = 8500
+    for i, theta in enumerate(theta_list):
+        for rho in rho_list:
+            x = math.cos(math.radians(theta)) * rho * math.cos(math.radians(elevation_list[i]))
+            y = math.sin(math.radians(theta)) * rho * math.cos(math.radians(elevation_list[i]))
+            lats = x / (111 * 1000) + pole[0]
+            lonx.append(y / (111 * 1000 * math.cos(math.pi * lats / 180)) + pole[1])
+            latx.append(lats)
+            height.append(rho * math.sin(math.radians(elevation_list[i])) + rho ** 2 / (2 * earth_rm * 1000))
+    return np.array(lonx), np.array(latx), np.array(height)
+
+
+def _polar_inputs():
+    rho = np.arange(250, 250 * 41, 250, dtype=np.float64)
+    theta = np.arange(0, 360, 7.5)
+    elevation = np.linspace(0.5, 19.5, theta.size)
+    return rho, theta, elevation
+
+
+def test_polar2cartesian_matches_loop(no_numba):
+    rho, theta, elevation = _polar_inputs()
+    result = C.polar2cartesian(rho, theta, elevation, _POLE)
+    expected = _polar2cartesian_loop(rho, theta, elevation, _POLE)
+    for a, b in zip(result, expected):
+        assert a.shape == (theta.size * rho.size,)
+        np.testing.assert_allclose(a, b, rtol=1e-12, atol=1e-9)
+
+
+def _latlon_inputs():
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(-80, 80, 200)
+    lons = rng.uniform(-180, 180, 200)
+    return lats, lons
+
+
+def _scalar(func):
+    '''标量函数的纯Python版本(已被numba编译时取py_func)'''
+    return getattr(func, 'py_func', func)
+
+
+@pytest.mark.parametrize("vec,scalar", [
+    (C.haversine_distance_vec, C.haversine_distance),
+    (C.calculate_bearing_vec, C.calculate_bearing),
+])
+def test_vec_matches_scalar(no_numba, vec, scalar):
+    lats, lons = _latlon_inputs()
+    result = vec(lats, lons, _POLE[0], _POLE[1])
+    expected = [_scalar(scalar)(la, lo, _POLE[0], _POLE[1]) for la, lo in zip(lats, lons)]
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-9)
+    # 反向调用(站点在前)同样逐点一致
+    result = vec(_POLE[0], _POLE[1], lats, lons)
+    expected = [_scalar(scalar)(_POLE[0], _POLE[1], la, lo) for la, lo in zip(lats, lons)]
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-9)
+
+
+_VEC_THEN_SCALAR = """
+from DongRadar import RadarCalculationHelper as C
+C.haversine_distance_vec([35.5], [104.5], 35.0, 104.0)
+C.calculate_bearing_vec(35.0, 104.0, [35.5], [104.5])
+C.haversine_distance(35.5, 104.5, 35.0, 104.0)
+C.calculate_bearing(35.0, 104.0, 35.5, 104.5)
+"""
+
+
+def test_numba_matches_numpy(monkeypatch):
+    pytest.importorskip("numba")
+    rho, theta, elevation = _polar_inputs()
+    lats, lons = _latlon_inputs()
+    jit_results = [
+        C.polar2cartesian(rho, theta, elevation, _POLE),
+        C.haversine_distance_vec(lats, lons, _POLE[0], _POLE[1]),
+        C.calculate_bearing_vec(_POLE[0], _POLE[1], lats, lons),
+    ]
+    monkeypatch.setattr(C, 'numba', None)
+    expected = [
+        C.polar2cartesian(rho, theta, elevation, _POLE),
+        C.haversine_distance_vec(lats, lons, _POLE[0], _POLE[1]),
+        C.calculate_bearing_vec(_POLE[0], _POLE[1], lats, lons),
+    ]
+    for a, b in zip(jit_results[0], expected[0]):
+        np.testing.assert_allclose(a, b, rtol=1e-9)
+    for a, b in zip(jit_results[1:], expected[1:]):
+        np.testing.assert_allclose(a, b, rtol=1e-9)
+    # 编译后的标量函数与纯Python版本一致
+    for func in (C.haversine_distance, C.calculate_bearing):
+        assert func(lats[0], lons[0], _POLE[0], _POLE[1]) == pytest.approx(
+            _scalar(func)(lats[0], lons[0], _POLE[0], _POLE[1]), rel=1e-9)
+
+
+def test_numba_vectorized_then_scalar_in_one_process():
+    pytest.importorskip("numba")
+    # 第二次运行会加载第一次写入的编译缓存，两次都须正常退出
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(2):
+        proc = subprocess.run([sys.executable, "-c", _VEC_THEN_SCALAR], cwd=root,
+                              capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""radar_colormap查找表检查"""
+
+import numpy as np
+import matplotlib.colors as cmx
+import pytest
+
+from DongRadar import RadarDrawHelper as H
+
+_TABLES = {"dBZ": H._DBZ_TABLE, "W": H._W_TABLE, "V": H._V_TABLE}
+
+
+def _reference_segmentdata(arr, sep):
+    '''按原先逐行构建segmentdata的方式生成参考数据，sep为True时为按值分块'''
+    value = [float(i[0]) for i in arr]
+    rgb = [[int(c) / 255 for c in i[1:4]] for i in arr]
+    inivalue = value[0]
+    drange = value[-1] - inivalue
+    parts = {'red': [], 'green': [], 'blue': []}
+    for count in range(len(value)):
+        for c, name in enumerate(('red', 'green', 'blue')):
+            color = rgb[count][c]
+            if sep and count == len(value) - 1:
+                parts[name].append((1, color, color))
+                continue
+            parts[name].append(((value[count] - inivalue) / drange, color, color))
+            if sep:
+                parts[name].append(((value[count + 1] - inivalue - 1e-5) / drange, color, color))
+    return parts
+
+
+@pytest.mark.parametrize("colortable_type", ["dBZ", "W", "V"])
+@pytest.mark.parametrize("sep,spacing", [(False, 'c'), (True, 'v')])
+def test_proportion_lut_matches_linear_segmented(colortable_type, sep, spacing):
+    '''proportion=True时np.interp查找表与LinearSegmentedColormap一致'''
+    ref = cmx.LinearSegmentedColormap('ref', _reference_segmentdata(_TABLES[colortable_type], sep), 256)
+    cmap = H.radar_colormap(colortable_type, True, sep, spacing)
+    x = np.linspace(0, 1, 1001)
+    assert cmap.N == 256
+    np.testing.assert_allclose(cmap(x), ref(x), atol=1e-12)
+
+
+@pytest.mark.parametrize("colortable_type", ["dBZ", "W", "V"])
+def test_proportion_false_holds_last_color(colortable_type):
+    '''proportion=False时节点等距位于i/N处，最后1/N保持最后一种颜色'''
+    arr = _TABLES[colortable_type]
+    n = len(arr)
+    lut = H.radar_colormap(colortable_type, False, False, 'c')(np.arange(256))[:, :3]
+    xs = np.linspace(0, 1, 256)
+    np.testing.assert_allclose(lut[0], arr[0, 1:4] / 255)
+    np.testing.assert_allclose(lut[xs >= (n - 1) / n], np.broadcast_to(arr[-1, 1:4] / 255, lut[xs >= (n - 1) / n].shape))
+